@@ -0,0 +1,118 @@
+"""Cold-start benchmark for the Copywriter app.
+
+Each target is imported in a fresh Python interpreter so every run pays the
+full import graph, the same way a cold Streamlit start does. For each target
+we report the median wall-clock import time and the peak resident memory.
+
+Usage:
+    python benchmarks/startup.py                 # print results
+    python benchmarks/startup.py --runs 10       # more samples per target
+    python benchmarks/startup.py --record        # also append to startup_history.jsonl
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_history.jsonl")
+
+# name -> statement executed in the child interpreter
+TARGETS = {
+    # What every Streamlit rerun pays before the form can render
+    "ui_shell": "import streamlit_app",
+    # Workflow module without building a graph
+    "workflow_module": "import main",
+    # Full path taken on the first submit: heavy modules plus a compiled graph
+    "workflow_compiled": (
+        "import main\n"
+        "from langchain_groq import ChatGroq\n"
+        "main.create_copywriting_workflow(ChatGroq(groq_api_key='benchmark', model='llama-3.3-70b-versatile'))"
+    ),
+}
+
+CHILD_TEMPLATE = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == "darwin":
+    rss_kb //= 1024  # macOS reports bytes
+print(json.dumps({{"seconds": elapsed, "max_rss_kb": rss_kb, "modules": len(sys.modules)}}))
+"""
+
+def run_target(statement: str) -> dict:
+    """Run a single cold import in a fresh interpreter and return its measurements."""
+    code = CHILD_TEMPLATE.format(root=REPO_ROOT, statement=statement)
+    proc = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        last_line = (proc.stderr.strip().splitlines() or ["unknown error"])[-1]
+        return {"error": last_line}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def benchmark(runs: int) -> dict:
+    """Measure every target `runs` times and summarise with the median."""
+    results = {}
+    for name, statement in TARGETS.items():
+        samples = []
+        for _ in range(runs):
+            sample = run_target(statement)
+            if "error" in sample:
+                results[name] = sample
+                break
+            samples.append(sample)
+        else:
+            results[name] = {
+                "median_seconds": round(statistics.median(s["seconds"] for s in samples), 4),
+                "max_rss_mb": round(max(s["max_rss_kb"] for s in samples) / 1024, 1),
+                "modules": samples[-1]["modules"],
+            }
+    return results
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import time and memory.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per target")
+    parser.add_argument("--record", action="store_true", help=f"Append results to {os.path.basename(HISTORY_FILE)}")
+    args = parser.parse_args()
+
+    results = benchmark(args.runs)
+
+    for name, data in results.items():
+        if "error" in data:
+            print(f"{name:<20} failed: {data['error']}")
+        else:
+            print(f"{name:<20} {data['median_seconds'] * 1000:8.1f} ms  {data['max_rss_mb']:7.1f} MB  {data['modules']:5d} modules")
+
+    if args.record:
+        entry = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "runs": args.runs,
+            "results": results,
+        }
+        with open(HISTORY_FILE, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        print(f"Recorded to {HISTORY_FILE}")
+
+if __name__ == "__main__":
+    main()
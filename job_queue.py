@@ -0,0 +1,410 @@
+"""Local job queue for large campaign runs.
+
+Briefs are stored in a SQLite database and consumed by N worker processes.
+Each worker compiles its own workflow once and shares a cross-process rate
+limiter (also backed by SQLite) so the combined request rate stays under the
+provider limit while parsing and state merging run on separate cores.
+
+Usage:
+    python job_queue.py enqueue briefs.json          # list of brief objects
+    python job_queue.py work --workers 4 --rpm 30
+    python job_queue.py status
+    python job_queue.py results > results.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+import traceback
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from main import BRIEF_FIELDS, create_initial_state
+from model_pool import ModelPool
+
+DEFAULT_DB_PATH = "jobs.db"
+
+# A running job whose worker has not touched it for this long is treated as abandoned
+DEFAULT_LEASE_SECONDS = 600
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    """Open a connection in autocommit mode so transactions are explicit."""
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+@contextmanager
+def _connection(db_path: str):
+    conn = _connect(db_path)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+class JobQueue:
+    """Durable FIFO of copywriting briefs shared by all worker processes."""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        with _connection(db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    brief TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+
+    def _validate(self, brief: Dict[str, str]) -> None:
+        if not isinstance(brief, dict):
+            raise ValueError(f"Brief must be a JSON object, got {type(brief).__name__}")
+        missing = [field for field in BRIEF_FIELDS if not brief.get(field)]
+        if missing:
+            raise ValueError(f"Brief is missing required fields: {', '.join(missing)}")
+
+    def enqueue(self, brief: Dict[str, str]) -> int:
+        """Add a brief to the queue and return its job id."""
+        return self.enqueue_many([brief])[0]
+
+    def enqueue_many(self, briefs: List[Dict[str, str]]) -> List[int]:
+        """Validate every brief, then add them all in one transaction so nothing is half-enqueued."""
+        for index, brief in enumerate(briefs):
+            try:
+                self._validate(brief)
+            except ValueError as e:
+                raise ValueError(f"Brief {index}: {e}") from None
+
+        now = time.time()
+        conn = _connect(self.db_path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            job_ids = [
+                conn.execute(
+                    "INSERT INTO jobs (brief, created_at, updated_at) VALUES (?, ?, ?)",
+                    (json.dumps(brief), now, now)
+                ).lastrowid
+                for brief in briefs
+            ]
+            conn.execute("COMMIT")
+            return job_ids
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def claim(self, worker: str) -> Optional[Tuple[int, Dict[str, str]]]:
+        """Atomically take the oldest pending job, or return None if there is none."""
+        conn = _connect(self.db_path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, brief FROM jobs WHERE status = 'pending' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (worker, time.time(), row[0])
+            )
+            conn.execute("COMMIT")
+            return row[0], json.loads(row[1])
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def complete(self, job_id: int, worker: str, result: Dict) -> bool:
+        """Store the result. Returns False if `worker` no longer holds the job."""
+        with _connection(self.db_path) as conn:
+            cursor = conn.execute(
+                """
+                UPDATE jobs SET status = 'done', result = ?, error = NULL, updated_at = ?
+                WHERE id = ? AND worker = ? AND status = 'running'
+                """,
+                (json.dumps(result, default=str), time.time(), job_id, worker)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: int, worker: str, error: str, max_attempts: int) -> bool:
+        """Record a failure and put the job back in the queue until it runs out of attempts.
+
+        Returns False if `worker` no longer holds the job.
+        """
+        with _connection(self.db_path) as conn:
+            cursor = conn.execute(
+                """
+                UPDATE jobs
+                SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    error = ?, updated_at = ?
+                WHERE id = ? AND worker = ? AND status = 'running'
+                """,
+                (max_attempts, error, time.time(), job_id, worker)
+            )
+            return cursor.rowcount == 1
+
+    def heartbeat(self, job_id: int, worker: str) -> None:
+        """Extend the lease on a running job held by `worker`."""
+        with _connection(self.db_path) as conn:
+            conn.execute(
+                "UPDATE jobs SET updated_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time(), job_id, worker)
+            )
+
+    def requeue_stale(self, max_attempts: int, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> int:
+        """Reclaim running jobs whose lease expired, e.g. after a worker crash.
+
+        Jobs with attempts left go back to the queue; jobs that have used all of
+        them are marked failed, so a brief that keeps killing its worker is not
+        retried forever. Jobs held by live workers are kept fresh by `heartbeat`,
+        so a second run against the same database leaves them alone.
+        """
+        now = time.time()
+        with _connection(self.db_path) as conn:
+            cursor = conn.execute(
+                """
+                UPDATE jobs
+                SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    error = CASE WHEN attempts >= ? THEN 'Worker stopped responding on the last attempt' ELSE error END,
+                    updated_at = ?
+                WHERE status = 'running' AND updated_at < ?
+                """,
+                (max_attempts, max_attempts, now, now - lease_seconds)
+            )
+            return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with _connection(self.db_path) as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def results(self) -> List[Dict]:
+        with _connection(self.db_path) as conn:
+            rows = conn.execute(
+                "SELECT id, status, brief, result, error FROM jobs ORDER BY id"
+            ).fetchall()
+        return [
+            {
+                "id": job_id,
+                "status": status,
+                "brief": json.loads(brief),
+                "result": json.loads(result) if result else None,
+                "error": error
+            }
+            for job_id, status, brief, result, error in rows
+        ]
+
+class RateLimiter:
+    """Token bucket shared across processes through a row in the SQLite database."""
+
+    def __init__(self, db_path: str, requests_per_minute: float, burst: Optional[int] = None):
+        self.db_path = db_path
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst or max(1, int(requests_per_minute // 6)))
+        with _connection(db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limit (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute(
+                "INSERT OR IGNORE INTO rate_limit (id, tokens, updated_at) VALUES (1, ?, ?)",
+                (self.capacity, time.time())
+            )
+
+    def _try_acquire(self) -> float:
+        """Take a token if one is available. Returns 0 on success, else seconds to wait."""
+        conn = _connect(self.db_path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            tokens, updated_at = conn.execute(
+                "SELECT tokens, updated_at FROM rate_limit WHERE id = 1"
+            ).fetchone()
+            now = time.time()
+            tokens = min(self.capacity, tokens + (now - updated_at) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            conn.execute(
+                "UPDATE rate_limit SET tokens = ?, updated_at = ? WHERE id = 1",
+                (tokens, now)
+            )
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def acquire(self) -> None:
+        while (wait := self._try_acquire()) > 0:
+            time.sleep(wait)
+
+    async def aacquire(self) -> None:
+        # The SQLite transaction can block on the busy timeout, so keep it off the event loop
+        while (wait := await asyncio.to_thread(self._try_acquire)) > 0:
+            await asyncio.sleep(wait)
+
+class RateLimitedModel:
+    """Wrap a chat model so every call first takes a token from the shared limiter."""
+
+    def __init__(self, model, limiter: RateLimiter):
+        self.model = model
+        self.limiter = limiter
+
+    def invoke(self, *args, **kwargs):
+        self.limiter.acquire()
+        return self.model.invoke(*args, **kwargs)
+
+    async def ainvoke(self, *args, **kwargs):
+        await self.limiter.aacquire()
+        return await self.model.ainvoke(*args, **kwargs)
+
+    def bind(self, **kwargs):
+        return RateLimitedModel(self.model.bind(**kwargs), self.limiter)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+def default_model_factory():
+    """Build the same Groq model as the Streamlit app, keyed from GROQ_API_KEY."""
+    from langchain_groq import ChatGroq
+
+    return ChatGroq(temperature=0.3, groq_api_key=os.environ["GROQ_API_KEY"], model="llama-3.3-70b-versatile", request_timeout=60)
+
+async def _heartbeat(queue: JobQueue, job_id: int, worker: str, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(queue.heartbeat, job_id, worker)
+
+async def _worker_loop(worker: str, queue: JobQueue, workflow, max_attempts: int, lease_seconds: float) -> None:
+    """Drain the queue inside one event loop so the model's async client is reused safely."""
+    while (job := queue.claim(worker)) is not None:
+        job_id, brief = job
+        heartbeat = asyncio.create_task(_heartbeat(queue, job_id, worker, lease_seconds / 3))
+        try:
+            final_state = await workflow.ainvoke(input=create_initial_state(brief))
+            if queue.complete(job_id, worker, final_state["final_summary"]):
+                print(f"[{worker}] job {job_id} done")
+            else:
+                print(f"[{worker}] job {job_id} finished after its lease was reclaimed; result discarded")
+        except Exception as e:
+            print(f"[{worker}] job {job_id} failed: {e}")
+            queue.fail(job_id, worker, traceback.format_exc(), max_attempts)
+        finally:
+            heartbeat.cancel()
+
+def _worker_main(worker: str, db_path: str, requests_per_minute: float,
+                 model_factory: Callable, max_attempts: int, lease_seconds: float) -> None:
+    """Process entry point: compile one workflow and drain the queue."""
+    from main import create_copywriting_workflow
+
+    queue = JobQueue(db_path)
+    limiter = RateLimiter(db_path, requests_per_minute)
+    model = model_factory()
+    if isinstance(model, (list, tuple)):
+        model = ModelPool(model)
+    workflow = create_copywriting_workflow(RateLimitedModel(model, limiter))
+
+    asyncio.run(_worker_loop(worker, queue, workflow, max_attempts, lease_seconds))
+
+def run_workers(db_path: str = DEFAULT_DB_PATH, workers: int = os.cpu_count() or 1,
+                requests_per_minute: float = 30, model_factory: Callable = default_model_factory,
+                max_attempts: int = 3, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Dict[str, int]:
+    """Run worker processes until the queue is drained and return the final job counts.
+
+    Raises RuntimeError if any worker process exits with an error, for example
+    because the model could not be built.
+
+    `model_factory` is called once inside each worker, so it must be a picklable
+    top-level function. It may return a single chat model or a list of backends.
+    """
+    queue = JobQueue(db_path)
+    recovered = queue.requeue_stale(max_attempts, lease_seconds)
+    if recovered:
+        print(f"Reclaimed {recovered} job(s) whose worker stopped responding")
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=_worker_main,
+            args=(f"{os.getpid()}-worker-{i}", db_path, requests_per_minute, model_factory, max_attempts, lease_seconds)
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    failed = [process.name for process in processes if process.exitcode != 0]
+    if failed:
+        raise RuntimeError(
+            f"{len(failed)} of {len(processes)} worker(s) exited with errors; job counts: {json.dumps(queue.counts())}")
+
+    return queue.counts()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many copywriting briefs through a local job queue.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the SQLite queue database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = subparsers.add_parser("enqueue", help="Add briefs from a JSON file")
+    enqueue_parser.add_argument("briefs", help="JSON file containing a list of briefs")
+
+    work_parser = subparsers.add_parser("work", help="Process queued briefs")
+    work_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    work_parser.add_argument("--rpm", type=float, default=30, help="Model requests per minute across all workers")
+    work_parser.add_argument("--max-attempts", type=int, default=3)
+    work_parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS,
+                             help="Seconds without a heartbeat before a running job is reclaimed")
+
+    subparsers.add_parser("status", help="Show job counts by status")
+    subparsers.add_parser("results", help="Print all jobs and their results as JSON")
+
+    args = parser.parse_args()
+    queue = JobQueue(args.db)
+
+    if args.command == "enqueue":
+        with open(args.briefs) as f:
+            briefs = json.load(f)
+        if not isinstance(briefs, list):
+            parser.exit(1, f"error: {args.briefs} must contain a JSON list of briefs\n")
+        try:
+            job_ids = queue.enqueue_many(briefs)
+        except ValueError as e:
+            parser.exit(1, f"error: {e}; nothing was enqueued\n")
+        print(f"Enqueued {len(job_ids)} brief(s)")
+    elif args.command == "work":
+        try:
+            counts = run_workers(args.db, args.workers, args.rpm, max_attempts=args.max_attempts, lease_seconds=args.lease)
+        except RuntimeError as e:
+            parser.exit(1, f"error: {e}\n")
+        print(json.dumps(counts))
+    elif args.command == "status":
+        print(json.dumps(queue.counts()))
+    elif args.command == "results":
+        print(json.dumps(queue.results(), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,4 @@
-from langgraph.graph import StateGraph, END
-from typing import Dict, TypedDict, List, Tuple, Union
-from langchain_core.prompts import PromptTemplate
-from langchain_core.messages import HumanMessage
+from typing import TYPE_CHECKING, Dict, TypedDict, List, Tuple, Union
 import json
 import re
 import traceback
@@ -22,8 +19,25 @@ from prompts import (
     AUTHENTICITY,
     IMPACT
 )
+from tokens import (
+    EDIT_OUTPUT_BUDGET,
+    FORMULA_SELECTION_BUDGET,
+    MAX_CONTENT_IDEA_TOKENS,
+    PARSE_OUTPUT_BUDGET,
+    SCORING_OUTPUT_BUDGET,
+    budget_to_words,
+    count_tokens,
+    format_output_budget,
+    merge_usage,
+    record_usage,
+    truncate_to_tokens
+)
+from model_pool import ModelPool
 import asyncio
 
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
+
 # Define types for the workflow
 class WorkflowState(TypedDict):
     content_idea: str
@@ -38,6 +52,8 @@ class WorkflowState(TypedDict):
     feedback: Dict[str, str]
     final_summary: Dict[str, str]
     revision_count: int
+    token_usage: Dict[str, int]  # Locally counted prompt/completion tokens across all model calls
+    token_budget: Dict[str, Union[str, int, bool]]  # Output and input limits applied to this run
 
 # Define available agents
 AVAILABLE_FORMULAS = [AIDA, PAS, BAB, FOURPs,
@@ -45,13 +61,35 @@ AVAILABLE_FORMULAS = [AIDA, PAS, BAB, FOURPs,
 
 SCORING_CRITERIA = [CLARITY, STORYTELLING, CREATIVITY, AUTHENTICITY, IMPACT]
 
+BRIEF_FIELDS = ["content_idea", "target_audience", "age", "format", "goal"]
+
+def create_initial_state(brief: Dict[str, str]) -> Dict:
+    """Build the starting workflow state for a single copywriting brief."""
+    return {
+        **{field: brief[field] for field in BRIEF_FIELDS},
+        "selected_formulas": [],
+        "drafts": {},
+        "scores": {},
+        "feedback": {},
+        "final_summary": {},
+        "token_usage": {},
+        "token_budget": {}
+    }
+
+def _human_message(content: str):
+    """Build a chat message, loading langchain_core on first use to keep startup light."""
+    from langchain_core.messages import HumanMessage
+    return HumanMessage(content=content)
+
 class TaskAgent:
     def __init__(self, model):
         self.model = model
 
-    async def _parse_formula_selection(self, response_text: str) -> Tuple[List[str], Dict[str, str]]:
+    async def _parse_formula_selection(self, response_text: str, usage: Dict[str, int]) -> Tuple[List[str], Dict[str, str]]:
         """Parse the LLM response to extract selected formulas and their reasoning."""
         try:
+            from langchain_core.prompts import PromptTemplate
+
             prompt = PromptTemplate(
                 template="Extract the formulas and their reasoning from this text and return ONLY a JSON object like this: {{'selected_formulas': ['formula1', 'formula2'], 'reasoning': {{'formula1': 'reason1', 'formula2': 'reason2'}}}}\n\nText: {text}",
                 input_variables=["text"]
@@ -60,9 +98,10 @@ class TaskAgent:
             formatted_prompt = prompt.format(text=response_text)
 
             try:
-                model_response = self.model.invoke([
-                    HumanMessage(content=formatted_prompt)
+                model_response = await self.model.bind(max_tokens=PARSE_OUTPUT_BUDGET).ainvoke([
+                    _human_message(formatted_prompt)
                 ])
+                record_usage(usage, formatted_prompt, model_response.content)
                 
                 try:
                     json_str = model_response.content.strip()
@@ -92,11 +131,17 @@ class TaskAgent:
     # Task Agent for selecting appropriate copywriting agents
     async def task_agent(self, state: WorkflowState) -> Dict:
         """Select appropriate copywriting formulas based on project requirements."""
+        usage = dict(state.get("token_usage") or {})
+
+        # Oversized ideas are cut once here so every later prompt uses the shorter text
+        content_idea, truncated = truncate_to_tokens(state['content_idea'], MAX_CONTENT_IDEA_TOKENS)
+        output_budget = format_output_budget(state['format'])
+
         prompt = f"""
         As a copywriting expert, analyze the following project requirements:
 
         Given the following requirements:
-        - Content idea: {state['content_idea']}
+        - Content idea: {content_idea}
         - Target audience: {state['target_audience']}
         - Age: {state['age']}
         - Format: {state['format']}
@@ -107,57 +152,160 @@ class TaskAgent:
         Format your response as a structured analysis for each selected formula.
         """
 
-        response = await self.model.ainvoke([HumanMessage(content=prompt)])
+        model = self.model.bind(max_tokens=FORMULA_SELECTION_BUDGET)
+        response = await model.ainvoke([_human_message(prompt)])
+        record_usage(usage, prompt, response.content)
         selected_formulas, reasoning = await self._parse_formula_selection(
-            response.content)
+            response.content, usage)
 
         return {
+            "content_idea": content_idea,
             "selected_formulas": selected_formulas,
             "formula_reasoning": reasoning,  # Added to include reasoning in the state
-            "revision_count": 0
+            "revision_count": 0,
+            "token_usage": usage,
+            "token_budget": {
+                "format": state['format'],
+                "max_output_tokens": output_budget,
+                "scoring_max_output_tokens": SCORING_OUTPUT_BUDGET,
+                "content_idea_max_tokens": MAX_CONTENT_IDEA_TOKENS,
+                "content_idea_tokens": count_tokens(state['content_idea']),
+                "content_idea_truncated": truncated
+            }
         }
 
+REVISION_MODES = ["rewrite", "edit"]
+
 class GenerateCopy:
-    def __init__(self, model):
+    def __init__(self, model, revision_mode: str = "rewrite"):
+        if revision_mode not in REVISION_MODES:
+            raise ValueError(f"revision_mode must be one of {REVISION_MODES}, got {revision_mode!r}")
         self.model = model
+        self.revision_mode = revision_mode
+
+    def _parse_patch(self, text: str) -> List[Dict[str, str]]:
+        """Parse a JSON list of {"find", "replace"} edits, raising ValueError if malformed.
+
+        An empty list is valid and means the draft needs no change.
+        """
+        if "```" in text:
+            matches = re.findall(r"```(?:json)?(.*?)```", text, re.DOTALL)
+            if matches:
+                text = matches[0]
+        start, end = text.find("["), text.rfind("]")
+        if start == -1 or end < start:
+            raise ValueError("No JSON list in patch response")
+
+        edits = json.loads(text[start:end + 1])
+        if not isinstance(edits, list):
+            raise ValueError("Patch must be a list of edits")
+        for edit in edits:
+            if not (isinstance(edit, dict)
+                    and isinstance(edit.get("find"), str) and edit["find"]
+                    and isinstance(edit.get("replace"), str)):
+                raise ValueError(f"Invalid edit: {edit!r}")
+        return edits
+
+    def _apply_patch(self, draft: str, edits: List[Dict[str, str]]) -> str:
+        """Apply edits in order. Each "find" must match exactly once in the current text."""
+        for edit in edits:
+            occurrences = draft.count(edit["find"])
+            if occurrences != 1:
+                raise ValueError(f"Edit target found {occurrences} times: {edit['find'][:80]!r}")
+            draft = draft.replace(edit["find"], edit["replace"])
+        return draft
+
+    async def _revise_draft(self, state: WorkflowState, formula: str, max_tokens: int, usage: Dict[str, int]) -> str:
+        """Ask for targeted edits to the previous draft and apply them locally."""
+        draft = state["drafts"][formula]
+        weak_criteria = [
+            f"{criterion} ({score}/10)"
+            for criterion, score in state["scores"].get(formula, {}).get("criteria", {}).items()
+            if score < 8.0
+        ]
+        prompt = f"""
+        You are a professional copywriter revising copy written with the {formula} formula.
+
+        Reviewer feedback: {state['feedback'].get(formula, 'No feedback available')}
+        Weakest criteria: {', '.join(weak_criteria) or 'none below 8/10'}
+
+        Current draft:
+        <<<
+        {draft}
+        >>>
+
+        Do NOT rewrite the whole copy. Return ONLY a JSON list of targeted edits that fix the weak points:
+        [{{"find": "exact text copied from the draft", "replace": "improved text"}}]
+
+        Rules:
+        1. Each "find" must appear exactly once in the current draft, copied character for character
+        2. Keep each edit as small as possible and use at most 5 edits
+        3. Keep the {formula} structure, the target audience tone and the call-to-action
+        4. Return [] if the draft needs no change
+        """
+
+        model = self.model.bind(max_tokens=min(EDIT_OUTPUT_BUDGET, max_tokens))
+        response = await model.ainvoke([_human_message(prompt)])
+        record_usage(usage, prompt, response.content)
+        return self._apply_patch(draft, self._parse_patch(response.content))
+
+    async def _generate_draft(self, state: WorkflowState, formula: str, model, max_tokens: int, usage: Dict[str, int]) -> str:
+        """Write one draft for a single formula, or patch the previous one in edit mode."""
+        if self.revision_mode == "edit" and formula in state.get("drafts", {}) and formula in state.get("feedback", {}):
+            # Drafts that already pass the threshold are kept as they are
+            if state.get("scores", {}).get(formula, {}).get("average", 0.0) >= 8.0:
+                return state["drafts"][formula]
+            try:
+                return await self._revise_draft(state, formula, max_tokens, usage)
+            except ValueError as e:
+                # Malformed or inapplicable patches fall back to a full rewrite;
+                # model and transport errors propagate as they do in rewrite mode
+                print(f"Patch Error for {formula}, rewriting: {str(e)}")
+
+        prompt = f"""
+        You are a professional copywriter specializing in the {formula} formula.
+        Create compelling copy for the following project:
+
+        Content Idea: {state['content_idea']}
+        Target Audience: {state['target_audience']}
+        Age Range: {state['age']}
+        Content Format: {state['format']}
+        Marketing Goal: {state['goal']}
+
+        Requirements:
+        1. Strictly follow the {formula} framework structure
+        2. Maintain a consistent tone aligned with the target audience
+        3. Ensure the copy length is appropriate for the specified format, keeping your whole response under {budget_to_words(max_tokens)} words
+        4. Include a clear call-to-action aligned with the marketing goal
+        5. You will be valuated based on the following criteria, and please try to get the highest score:
+        . {CLARITY} (1-10): Evaluate message clarity and readability
+        . {STORYTELLING} (1-10): Assess narrative flow and engagement
+        . {CREATIVITY} (1-10): Rate originality and innovative approach
+        . {AUTHENTICITY} (1-10): Measure genuineness and brand alignment
+        . {IMPACT} (1-10): Evaluate persuasiveness and call-to-action effectiveness
+
+        Generate the copy and briefly explain how each part aligns with the {formula} framework.
+        """
+
+        response = await model.ainvoke([_human_message(prompt)])
+        record_usage(usage, prompt, response.content)
+        return response.content
 
     # Copywriting Agents
     async def generate_copy(self, state: WorkflowState) -> Dict:
         drafts = {}
+        usage = dict(state.get("token_usage") or {})
+        max_tokens = format_output_budget(state['format'])
+        model = self.model.bind(max_tokens=max_tokens)
 
         for formula in state["selected_formulas"]:
-            prompt = f"""
-            You are a professional copywriter specializing in the {formula} formula.
-            Create compelling copy for the following project:
-
-            Content Idea: {state['content_idea']}
-            Target Audience: {state['target_audience']}
-            Age Range: {state['age']}
-            Content Format: {state['format']}
-            Marketing Goal: {state['goal']}
-
-            Requirements:
-            1. Strictly follow the {formula} framework structure
-            2. Maintain a consistent tone aligned with the target audience
-            3. Ensure the copy length is appropriate for the specified format
-            4. Include a clear call-to-action aligned with the marketing goal
-            5. You will be valuated based on the following criteria, and please try to get the highest score:
-            . {CLARITY} (1-10): Evaluate message clarity and readability
-            . {STORYTELLING} (1-10): Assess narrative flow and engagement
-            . {CREATIVITY} (1-10): Rate originality and innovative approach
-            . {AUTHENTICITY} (1-10): Measure genuineness and brand alignment
-            . {IMPACT} (1-10): Evaluate persuasiveness and call-to-action effectiveness
-
-            Generate the copy and briefly explain how each part aligns with the {formula} framework.
-            """
-
-            response = await self.model.ainvoke([HumanMessage(content=prompt)])
-            drafts[formula] = response.content
+            drafts[formula] = await self._generate_draft(state, formula, model, max_tokens, usage)
 
         # Increment revision count when generating new copy
         return {
             "drafts": drafts,
-            "revision_count": state.get("revision_count", 0) + 1
+            "revision_count": state.get("revision_count", 0) + 1,
+            "token_usage": usage
         }
 
 class ScoringAgent:
@@ -220,7 +368,7 @@ class ScoringAgent:
             print(f"Error extracting scores: {str(e)}")
             raise
 
-    async def _parse_scores(self, response_text: str) -> Dict:
+    async def _parse_scores(self, response_text: str, usage: Dict[str, int]) -> Dict:
         """Parse the scoring response to extract scores and feedback."""
         try:
             # First try to clean and parse as JSON
@@ -256,9 +404,11 @@ class ScoringAgent:
             {text}
             """
             
-            model_response = await self.model.ainvoke([
-                HumanMessage(content=prompt.format(text=response_text))
+            formatted_prompt = prompt.format(text=response_text)
+            model_response = await self.model.bind(max_tokens=SCORING_OUTPUT_BUDGET).ainvoke([
+                _human_message(formatted_prompt)
             ])
+            record_usage(usage, formatted_prompt, model_response.content)
             
             cleaned_json = self._fix_json_format(model_response.content)
             result = json.loads(cleaned_json)
@@ -287,45 +437,53 @@ class ScoringAgent:
                 "feedback": "Error parsing feedback. Using default scores."
             }
 
+    async def _score_draft(self, state: WorkflowState, draft: str, model, usage: Dict[str, int]) -> Dict:
+        """Score one draft and return its parsed criteria, average and feedback."""
+        prompt = f"""
+        Evaluate this copy and return ONLY a JSON object with scores and feedback.
+        Format must be exactly as shown - include all commas, no extra text:
+        {{
+            "criteria": {{
+                "clarity": 7,
+                "storytelling": 7,
+                "creativity": 7,
+                "authenticity": 7,
+                "impact": 7
+            }},
+            "average": 7,
+            "feedback": "feedback text"
+        }}
+        Keep the feedback under {budget_to_words(SCORING_OUTPUT_BUDGET) // 3} words so the JSON is never cut off.
+
+        Criteria:
+        1. {CLARITY} (1-10): Evaluate message clarity and readability
+        2. {STORYTELLING} (1-10): Assess narrative flow and engagement
+        3. {CREATIVITY} (1-10): Rate originality and innovative approach
+        4. {AUTHENTICITY} (1-10): Measure genuineness and brand alignment
+        5. {IMPACT} (1-10): Evaluate persuasiveness and call-to-action effectiveness
+
+        Copy to evaluate:
+        {draft}
+
+        Context:
+        - Target Audience: {state['target_audience']}
+        - Age Range: {state['age']}
+        - Goal: {state['goal']}
+        - Format: {state['format']}
+        """
+
+        response = await model.ainvoke([_human_message(prompt)])
+        record_usage(usage, prompt, response.content)
+        return await self._parse_scores(response.content, usage)
+
     async def scoring_agent(self, state: WorkflowState) -> Dict:
         scores = {}
         feedback = {}
+        usage = dict(state.get("token_usage") or {})
+        model = self.model.bind(max_tokens=SCORING_OUTPUT_BUDGET)
 
         for formula, draft in state["drafts"].items():
-            prompt = f"""
-            Evaluate this copy and return ONLY a JSON object with scores and feedback.
-            Format must be exactly as shown - include all commas, no extra text:
-            {{
-                "criteria": {{
-                    "clarity": 7,
-                    "storytelling": 7,
-                    "creativity": 7,
-                    "authenticity": 7,
-                    "impact": 7
-                }},
-                "average": 7,
-                "feedback": "feedback text"
-            }}
-
-            Criteria:
-            1. {CLARITY} (1-10): Evaluate message clarity and readability
-            2. {STORYTELLING} (1-10): Assess narrative flow and engagement
-            3. {CREATIVITY} (1-10): Rate originality and innovative approach
-            4. {AUTHENTICITY} (1-10): Measure genuineness and brand alignment
-            5. {IMPACT} (1-10): Evaluate persuasiveness and call-to-action effectiveness
-
-            Copy to evaluate:
-            {draft}
-
-            Context:
-            - Target Audience: {state['target_audience']}
-            - Age Range: {state['age']}
-            - Goal: {state['goal']}
-            - Format: {state['format']}
-            """
-
-            response = await self.model.ainvoke([HumanMessage(content=prompt)])
-            parsed_response = await self._parse_scores(response.content)
+            parsed_response = await self._score_draft(state, draft, model, usage)
 
             scores[formula] = {
                 "criteria": parsed_response["criteria"],
@@ -335,7 +493,58 @@ class ScoringAgent:
 
         return {
             "scores": scores,            
-            "feedback": feedback
+            "feedback": feedback,
+            "token_usage": usage
+        }
+
+class PipelinedGenerateAndScore:
+    """Generate and score each formula as its own pipeline.
+
+    Every formula's draft is scored as soon as it is written, so generation and
+    scoring of different formulas overlap instead of waiting on the slowest
+    draft. The node returns the same state keys as generate_copy and
+    scoring_agent combined.
+    """
+
+    def __init__(self, generate_copy: GenerateCopy, scoring_agent: ScoringAgent):
+        self.generate_copy = generate_copy
+        self.scoring_agent = scoring_agent
+
+    async def _run_formula(self, state: WorkflowState, formula: str, generate_model, scoring_model, max_tokens: int) -> Tuple[str, Dict, Dict[str, int]]:
+        usage = {}
+        draft = await self.generate_copy._generate_draft(state, formula, generate_model, max_tokens, usage)
+        parsed_response = await self.scoring_agent._score_draft(state, draft, scoring_model, usage)
+        return draft, parsed_response, usage
+
+    async def generate_and_score(self, state: WorkflowState) -> Dict:
+        max_tokens = format_output_budget(state['format'])
+        generate_model = self.generate_copy.model.bind(max_tokens=max_tokens)
+        scoring_model = self.scoring_agent.model.bind(max_tokens=SCORING_OUTPUT_BUDGET)
+
+        results = await asyncio.gather(*(
+            self._run_formula(state, formula, generate_model, scoring_model, max_tokens)
+            for formula in state["selected_formulas"]
+        ))
+
+        drafts = {}
+        scores = {}
+        feedback = {}
+        usage = dict(state.get("token_usage") or {})
+        for formula, (draft, parsed_response, formula_usage) in zip(state["selected_formulas"], results):
+            drafts[formula] = draft
+            scores[formula] = {
+                "criteria": parsed_response["criteria"],
+                "average": parsed_response["average"]
+            }
+            feedback[formula] = parsed_response["feedback"]
+            merge_usage(usage, formula_usage)
+
+        return {
+            "drafts": drafts,
+            "scores": scores,
+            "feedback": feedback,
+            "revision_count": state.get("revision_count", 0) + 1,
+            "token_usage": usage
         }
 
 def should_revise(state: WorkflowState) -> bool:
@@ -369,7 +578,9 @@ class CreateSummary:
             "scores": state["scores"],
             "feedback": state["feedback"],
             "best_performing": self._get_best_performing(state["scores"]),
-            "improvement_suggestions": self._get_improvement_suggestions(state)
+            "improvement_suggestions": self._get_improvement_suggestions(state),
+            "token_usage": state.get("token_usage", {}),
+            "token_budget": state.get("token_budget", {})
         }
 
         return {"final_summary": summary}
@@ -394,32 +605,55 @@ class CreateSummary:
         return suggestions
 
 # Define the workflow graph
-def create_copywriting_workflow(model) -> StateGraph:
+def create_copywriting_workflow(model, pipelined: bool = False, revision_mode: str = "rewrite") -> "StateGraph":
+    """Build the copywriting graph.
+
+    `model` is a chat model, or a list of interchangeable chat backends that is
+    wrapped in a ModelPool for latency-aware routing and failover.
+
+    With `pipelined=True` each formula is generated and scored in its own
+    concurrent pipeline instead of the generate_copy -> scoring_agent barrier.
+
+    With `revision_mode="edit"` revision passes ask the model for a small patch
+    against the previous draft instead of regenerating it in full.
+    """
+    if isinstance(model, (list, tuple)):
+        model = ModelPool(model)
+
+    # Heavy graph imports are deferred until a workflow is actually built
+    from langgraph.graph import StateGraph, END
+
     # Create workflow graph
     workflow = StateGraph(WorkflowState)
 
     task_agent = TaskAgent(model)
-    generate_copy = GenerateCopy(model)
+    generate_copy = GenerateCopy(model, revision_mode)
     scoring_agent = ScoringAgent(model)
     create_summary = CreateSummary(model)
 
     # Add nodes
     workflow.add_node("task_agent", task_agent.task_agent)
-    workflow.add_node("generate_copy", generate_copy.generate_copy)
-    workflow.add_node("scoring_agent", scoring_agent.scoring_agent)
     workflow.add_node("create_summary", create_summary.create_summary)
-
-    # Define edges
     workflow.set_entry_point("task_agent")
-    workflow.add_edge("task_agent", "generate_copy")
-    workflow.add_edge("generate_copy", "scoring_agent")
+
+    if pipelined:
+        pipeline = PipelinedGenerateAndScore(generate_copy, scoring_agent)
+        workflow.add_node("generate_and_score", pipeline.generate_and_score)
+        workflow.add_edge("task_agent", "generate_and_score")
+        scoring_node, generation_node = "generate_and_score", "generate_and_score"
+    else:
+        workflow.add_node("generate_copy", generate_copy.generate_copy)
+        workflow.add_node("scoring_agent", scoring_agent.scoring_agent)
+        workflow.add_edge("task_agent", "generate_copy")
+        workflow.add_edge("generate_copy", "scoring_agent")
+        scoring_node, generation_node = "scoring_agent", "generate_copy"
 
     # Add conditional routing
     workflow.add_conditional_edges(
-        "scoring_agent",
+        scoring_node,
         should_revise,
         {
-            True: "generate_copy",  # If score <= 8.0 and revisions < 3, go back to generate copy
+            True: generation_node,  # If score <= 8.0 and revisions < 3, go back to generate copy
             False: "create_summary"  # If score > 8.0 or revisions >= 3, proceed to summary
         }
     )
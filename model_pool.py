@@ -0,0 +1,268 @@
+"""Pool of interchangeable chat backends with latency-aware routing.
+
+Each call goes to the backend with the lowest expected cost, where cost is the
+EWMA of observed latency inflated by the EWMA error rate. A backend that fails
+`failure_threshold` times in a row has its circuit opened and is skipped until
+`cooldown` seconds pass, after which exactly one trial call is let through; when
+every circuit is open, calls fail immediately with AllBackendsFailedError instead
+of hitting dead providers. A small share of calls (`explore`) goes to a random
+healthy backend first so the estimates for slower backends stay current.
+
+Only backend errors (connection problems, timeouts, 429 and 5xx responses) fail
+over and count against a backend. Errors caused by the request itself, such as
+a 400 for an oversized prompt, would fail on every backend, so they are raised
+straight away without touching any circuit.
+
+The pool exposes `invoke`, `ainvoke` and `bind`, so it can be passed anywhere a
+single chat model is used. Only `ainvoke` enforces `timeout`; a blocking `invoke`
+cannot be abandoned, so sync callers rely on the backend's own request timeout.
+`LocalChatBackend` simulates slow or failing providers for local testing without
+network access.
+"""
+import asyncio
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Sequence
+
+from tokens import truncate_to_tokens
+
+class AllBackendsFailedError(RuntimeError):
+    """Raised when every backend in the pool failed for a single call."""
+
+# HTTP statuses that point at the provider rather than the request
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+# Provider SDK and httpx error classes for transport failures, matched by name so
+# no client library has to be imported here
+RETRYABLE_ERROR_NAMES = {
+    "APIConnectionError",
+    "APITimeoutError",
+    "RateLimitError",
+    "InternalServerError",
+    "ServiceUnavailableError",
+    "TransportError",
+    "TimeoutException",
+}
+
+def is_backend_error(error: BaseException) -> bool:
+    """Whether `error` says the backend is unhealthy, so the call should fail over."""
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+class BackendStats:
+    """Observed latency, error rate and circuit state for one backend."""
+
+    def __init__(self, name: str, alpha: float):
+        self.name = name
+        self.alpha = alpha
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False  # a half-open trial call is in flight
+        self.calls = 0
+
+    def record_success(self, latency: float) -> None:
+        self.calls += 1
+        self.latency_ewma = latency if self.latency_ewma is None else (
+            self.alpha * latency + (1 - self.alpha) * self.latency_ewma)
+        self.error_ewma = (1 - self.alpha) * self.error_ewma
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self, latency: float, failure_threshold: int) -> None:
+        self.calls += 1
+        # A failure costs at least as much time as it took to surface
+        self.latency_ewma = latency if self.latency_ewma is None else max(
+            self.latency_ewma, self.alpha * latency + (1 - self.alpha) * self.latency_ewma)
+        self.error_ewma = self.alpha + (1 - self.alpha) * self.error_ewma
+        self.consecutive_failures += 1
+        self.probing = False
+        if self.consecutive_failures >= failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def is_available(self, cooldown: float) -> bool:
+        """Closed circuits are available; open ones allow a single trial call after the cooldown."""
+        if self.opened_at is None:
+            return True
+        return not self.probing and time.monotonic() - self.opened_at >= cooldown
+
+    def try_enter(self, cooldown: float) -> bool:
+        """Claim the right to call this backend now, reserving the half-open probe if needed."""
+        if not self.is_available(cooldown):
+            return False
+        if self.opened_at is not None:
+            self.probing = True
+        return True
+
+    def cost(self, error_penalty: float) -> float:
+        # Untried backends get explored first
+        if self.latency_ewma is None:
+            return 0.0
+        return self.latency_ewma * (1 + error_penalty * self.error_ewma)
+
+    def as_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "latency_ewma": self.latency_ewma,
+            "error_ewma": round(self.error_ewma, 4),
+            "circuit_open": self.opened_at is not None
+        }
+
+class ModelPool:
+    """Route chat calls across several backends by observed latency and error rate."""
+
+    def __init__(self, backends: Sequence, names: Optional[Sequence[str]] = None,
+                 alpha: float = 0.3, error_penalty: float = 4.0,
+                 failure_threshold: int = 3, cooldown: float = 30.0,
+                 timeout: Optional[float] = None, explore: float = 0.05,
+                 seed: Optional[int] = None):
+        if not backends:
+            raise ValueError("ModelPool needs at least one backend")
+        names = names or [getattr(b, "name", None) or f"backend-{i}" for i, b in enumerate(backends)]
+        self.backends = list(backends)
+        self.error_penalty = error_penalty
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.timeout = timeout
+        self.explore = explore
+        self._random = random.Random(seed)
+        self._stats = [BackendStats(name, alpha) for name in names]
+        self._lock = threading.Lock()
+
+    def bind(self, **kwargs) -> "ModelPool":
+        """Bind call arguments on every backend while sharing routing statistics."""
+        bound = object.__new__(ModelPool)
+        bound.__dict__.update(self.__dict__)
+        bound.backends = [backend.bind(**kwargs) for backend in self.backends]
+        return bound
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            return [s.as_dict() for s in self._stats]
+
+    def _ranked(self) -> List[int]:
+        """Backend indices in the order they should be tried for the next call."""
+        with self._lock:
+            available = [i for i, s in enumerate(self._stats) if s.is_available(self.cooldown)]
+            ranked = sorted(available, key=lambda i: self._stats[i].cost(self.error_penalty))
+            if len(ranked) > 1 and self._random.random() < self.explore:
+                ranked.insert(0, ranked.pop(self._random.randrange(1, len(ranked))))
+            return ranked
+
+    def _try_enter(self, index: int) -> bool:
+        # Re-checked at call time: another caller may have taken the half-open probe
+        with self._lock:
+            return self._stats[index].try_enter(self.cooldown)
+
+    def _release(self, index: int) -> None:
+        """Give up a half-open probe without a result, e.g. when the call was cancelled."""
+        with self._lock:
+            self._stats[index].probing = False
+
+    def _record(self, index: int, started: float, error: Optional[Exception]) -> None:
+        latency = time.monotonic() - started
+        with self._lock:
+            if error is None:
+                self._stats[index].record_success(latency)
+            else:
+                self._stats[index].record_failure(latency, self.failure_threshold)
+
+    def _failure_message(self, errors: List[str]) -> str:
+        if not errors:
+            return "All backends failed: every circuit is open"
+        return "All backends failed: " + "; ".join(errors)
+
+    def invoke(self, *args, **kwargs):
+        """Blocking call with failover on backend errors. `timeout` is not enforced here; use `ainvoke`."""
+        errors = []
+        for index in self._ranked():
+            if not self._try_enter(index):
+                continue
+            started = time.monotonic()
+            try:
+                response = self.backends[index].invoke(*args, **kwargs)
+            except Exception as e:
+                if not is_backend_error(e):
+                    # The request itself is bad; every backend would reject it
+                    self._release(index)
+                    raise
+                self._record(index, started, e)
+                errors.append(f"{self._stats[index].name}: {e}")
+                continue
+            except BaseException:
+                self._release(index)
+                raise
+            self._record(index, started, None)
+            return response
+        raise AllBackendsFailedError(self._failure_message(errors))
+
+    async def ainvoke(self, *args, **kwargs):
+        """Async call with failover on backend errors; each attempt is cut off after `timeout` seconds."""
+        errors = []
+        for index in self._ranked():
+            if not self._try_enter(index):
+                continue
+            started = time.monotonic()
+            try:
+                response = await asyncio.wait_for(
+                    self.backends[index].ainvoke(*args, **kwargs), self.timeout)
+            except Exception as e:
+                if not is_backend_error(e):
+                    # The request itself is bad; every backend would reject it
+                    self._release(index)
+                    raise
+                self._record(index, started, e)
+                errors.append(f"{self._stats[index].name}: {e!r}")
+                continue
+            except BaseException:
+                self._release(index)
+                raise
+            self._record(index, started, None)
+            return response
+        raise AllBackendsFailedError(self._failure_message(errors))
+
+class LocalChatBackend:
+    """Stand-in chat backend that simulates provider latency and failures locally."""
+
+    def __init__(self, name: str, latency: float = 0.0, failure_rate: float = 0.0,
+                 respond: Optional[Callable[[list], str]] = None,
+                 max_tokens: Optional[int] = None, seed: Optional[int] = None):
+        self.name = name
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.respond = respond or (lambda messages: f"Response from {name}")
+        self.max_tokens = max_tokens
+        self._random = random.Random(seed)
+
+    def bind(self, max_tokens: Optional[int] = None, **kwargs) -> "LocalChatBackend":
+        bound = object.__new__(LocalChatBackend)
+        bound.__dict__.update(self.__dict__)
+        bound.max_tokens = max_tokens if max_tokens is not None else self.max_tokens
+        return bound
+
+    def _reply(self, messages):
+        if self._random.random() < self.failure_rate:
+            raise ConnectionError(f"{self.name} is unavailable")
+        content = self.respond(messages)
+        if self.max_tokens is not None:
+            content, _ = truncate_to_tokens(content, self.max_tokens)
+        return SimpleNamespace(content=content)
+
+    def invoke(self, messages, **kwargs):
+        time.sleep(self.latency)
+        return self._reply(messages)
+
+    async def ainvoke(self, messages, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._reply(messages)
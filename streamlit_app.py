@@ -1,30 +1,13 @@
 import streamlit as st
-from langchain_groq import ChatGroq
-from main import create_copywriting_workflow
 from typing import Dict, Any, Optional
-from langchain.callbacks.base import BaseCallbackHandler
 import os
 import asyncio
 
-class StreamlitCallbackHandler(BaseCallbackHandler):
-    """Custom callback handler to update Streamlit interface during processing"""
+# LLM and graph modules (langchain_groq, langgraph) are imported lazily
+# so the page shell and input form render without paying for them on every rerun.
 
-    def __init__(self, status_placeholder):
-        self.status_placeholder = status_placeholder
-        self.token_buffer = ""  # Buffer for token accumulation
-
-    def on_llm_start(self, *args, **kwargs):
-        self.status_placeholder.markdown("🤔 Thinking...")
-
-    def on_llm_end(self, *args, **kwargs):
-        self.status_placeholder.markdown("✅ Done!")
-
-    def on_llm_new_token(self, token: str, **kwargs):
-        # Accumulate tokens in buffer and update periodically
-        self.token_buffer += token
-        if len(self.token_buffer) > 10:  # Update every 10 tokens
-            self.status_placeholder.markdown(f"Generating: {self.token_buffer}")
-            self.token_buffer = ""
+# Each format needs an output budget in tokens.FORMAT_OUTPUT_BUDGETS
+FORMAT_OPTIONS = ["Short video script", "Social Media Post", "LinkedIn Post", "Case studies", "Marketing Email"]
 
 def setup_environment():
     """Set up environment variables from Streamlit secrets"""
@@ -110,7 +93,7 @@ def create_input_form() -> Optional[Dict[str, str]]:
             )
 
         age = st.radio("Select the target age of your audience:", ["18-24", "25-34", "35-44", "45-54", "55+"], horizontal=True)
-        format = st.radio("Select your content format:", ["Short video script", "Social Media Post", "LinkedIn Post", "Case studies", "Marketing Email"], horizontal=True)
+        format = st.radio("Select your content format:", FORMAT_OPTIONS, horizontal=True)
         goal = st.radio("Select the goal of your content:", ["Awareness", "Engagement", "Education", "Conversion"], horizontal=True)
 
         submit_button = st.form_submit_button("Generate")
@@ -168,6 +151,16 @@ def display_results(workflow_state: Dict[str, Any]):
             with st.expander(f"Suggestions for {formula}"):
                 for suggestion in suggestions:
                     st.markdown(f"- {suggestion}")
+        usage = summary.get("token_usage", {})
+        budget = summary.get("token_budget", {})
+        if usage:
+            st.caption(
+                f"Tokens (estimated): {usage.get('prompt_tokens', 0)} prompt, "
+                f"{usage.get('completion_tokens', 0)} output across {usage.get('calls', 0)} calls. "
+                f"Output budget per draft: {budget.get('max_output_tokens', 'N/A')} tokens."
+            )
+        if budget.get("content_idea_truncated"):
+            st.warning(f"Your content idea was shortened to {budget['content_idea_max_tokens']} tokens.")
 
 async def run_workflow_async(state_machine, workflow_state):
     try:
@@ -180,8 +173,14 @@ async def run_workflow_async(state_machine, workflow_state):
     
 def initialize_workflow(api_key):
     try:
+        # Imported here so the page renders without them; Python caches the modules after
+        # the first submit. The model is built per run so its async client is never
+        # reused across the event loops that asyncio.run creates on each submit.
+        from langchain_groq import ChatGroq
+        from main import create_copywriting_workflow
+
         model = ChatGroq(temperature=0.3, groq_api_key=api_key, model="llama-3.3-70b-versatile", request_timeout=60) # Or your LLM
-        workflow = create_copywriting_workflow(model)
+        workflow = create_copywriting_workflow(model, pipelined=True, revision_mode="edit")
         return workflow
     except Exception as e:  # Handle any exceptions during workflow initialization
         st.error(f"An error occurred during workflow initialization: {e}")
@@ -200,25 +199,16 @@ def main():
         if not api_key:
             return
 
-        workflow = initialize_workflow(api_key)
-        if not workflow:
-            return  # Exit if workflow initialization failed
-
-        status_placeholder = st.empty()
-        callback_handler = StreamlitCallbackHandler(status_placeholder)
-
         input_data = create_input_form()
 
         if input_data:
             with st.spinner("Generating optimized copy..."):
-                initial_workflow_state = {  # Initialize the workflow state
-                    **input_data,
-                    "selected_formulas": [],
-                    "drafts": {},
-                    "scores": {},
-                    "feedback": {},
-                    "final_summary": {}
-                }
+                workflow = initialize_workflow(api_key)
+                if not workflow:
+                    return  # Exit if workflow initialization failed
+
+                from main import create_initial_state
+                initial_workflow_state = create_initial_state(input_data)  # Initialize the workflow state
 
                 final_state = asyncio.run(
                     run_workflow_async(workflow, initial_workflow_state),)
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from main import GenerateCopy, create_initial_state
+from model_pool import LocalChatBackend
+
+
+@pytest.fixture
+def generator():
+    return GenerateCopy(LocalChatBackend("local"), revision_mode="edit")
+
+
+def test_parse_patch_reads_fenced_json(generator):
+    text = 'Here are the edits:\n```json\n[{"find": "Buy now.", "replace": "Start today."}]\n```'
+
+    assert generator._parse_patch(text) == [{"find": "Buy now.", "replace": "Start today."}]
+
+
+def test_parse_patch_accepts_empty_list(generator):
+    assert generator._parse_patch("[]") == []
+
+
+@pytest.mark.parametrize("text", [
+    "no edits here",
+    '{"find": "a", "replace": "b"}',
+    '[{"find": "a", "replace": "b"',
+    '[{"find": "", "replace": "b"}]',
+    '[{"find": "a"}]',
+    '["a"]',
+])
+def test_parse_patch_rejects_malformed(generator, text):
+    with pytest.raises(ValueError):
+        generator._parse_patch(text)
+
+
+def test_apply_patch_applies_edits_in_sequence(generator):
+    edits = [
+        {"find": "Buy now.", "replace": "Start your trial."},
+        {"find": "Start your trial.", "replace": "Start your free trial today."},
+    ]
+
+    assert generator._apply_patch("Buy now. It works.", edits) == "Start your free trial today. It works."
+
+
+@pytest.mark.parametrize("find", ["missing", "now"])
+def test_apply_patch_rejects_zero_or_multiple_matches(generator, find):
+    with pytest.raises(ValueError, match="found"):
+        generator._apply_patch("Buy now, not later, now.", [{"find": find, "replace": "x"}])
+
+
+def revision_state(average):
+    state = create_initial_state({
+        "content_idea": "No-code AI tools",
+        "target_audience": "Small business owners",
+        "age": "35-44",
+        "format": "LinkedIn Post",
+        "goal": "Awareness",
+    })
+    state.update(
+        selected_formulas=["AIDA"],
+        drafts={"AIDA": "Already strong copy."},
+        feedback={"AIDA": "Good work."},
+        scores={"AIDA": {"criteria": {"clarity": average}, "average": average}},
+    )
+    return state
+
+
+def edit_responder(patch_reply):
+    """Answer edit prompts with `patch_reply` (raised if it is an exception) and anything else with a full rewrite."""
+    def respond(messages):
+        if "Do NOT rewrite the whole copy" not in messages[0].content:
+            return "Fully rewritten copy."
+        if isinstance(patch_reply, Exception):
+            raise patch_reply
+        return patch_reply
+    return respond
+
+
+def test_edit_mode_keeps_passing_drafts(generator):
+    result = asyncio.run(generator.generate_copy(revision_state(8.5)))
+
+    assert result["drafts"] == {"AIDA": "Already strong copy."}
+
+
+def test_edit_mode_applies_patch_to_failing_draft():
+    generator = GenerateCopy(LocalChatBackend(
+        "local", respond=edit_responder('[{"find": "Already strong", "replace": "Much stronger"}]')),
+        revision_mode="edit")
+
+    result = asyncio.run(generator.generate_copy(revision_state(6.0)))
+
+    assert result["drafts"] == {"AIDA": "Much stronger copy."}
+    assert result["token_usage"]["calls"] == 1
+
+
+@pytest.mark.parametrize("patch_reply", [
+    "I would tighten the opening line.",
+    '[{"find": "not in the draft", "replace": "x"}]',
+])
+def test_edit_mode_falls_back_to_rewrite_on_bad_patch(patch_reply):
+    generator = GenerateCopy(LocalChatBackend("local", respond=edit_responder(patch_reply)), revision_mode="edit")
+
+    result = asyncio.run(generator.generate_copy(revision_state(6.0)))
+
+    assert result["drafts"] == {"AIDA": "Fully rewritten copy."}
+    assert result["token_usage"]["calls"] == 2
+
+
+def test_edit_mode_propagates_model_errors():
+    generator = GenerateCopy(
+        LocalChatBackend("local", respond=edit_responder(RuntimeError("quota exceeded"))), revision_mode="edit")
+
+    with pytest.raises(RuntimeError, match="quota exceeded"):
+        asyncio.run(generator.generate_copy(revision_state(6.0)))
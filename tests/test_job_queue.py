@@ -0,0 +1,136 @@
+import json
+import sqlite3
+import time
+
+import pytest
+
+from job_queue import JobQueue, RateLimiter, run_workers
+from model_pool import LocalChatBackend
+
+BRIEF = {
+    "content_idea": "No-code AI tools improve small business productivity",
+    "target_audience": "Small business owners",
+    "age": "35-44",
+    "format": "LinkedIn Post",
+    "goal": "Awareness",
+}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.db")
+
+
+@pytest.fixture
+def queue(db_path):
+    return JobQueue(db_path)
+
+
+def set_updated_at(db_path, job_id, updated_at):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (updated_at, job_id))
+    conn.close()
+
+
+def test_claims_jobs_in_fifo_order(queue):
+    first, second = queue.enqueue_many([dict(BRIEF, goal="Awareness"), dict(BRIEF, goal="Conversion")])
+
+    assert queue.claim("w1") == (first, dict(BRIEF, goal="Awareness"))
+    assert queue.claim("w2") == (second, dict(BRIEF, goal="Conversion"))
+    assert queue.claim("w3") is None
+    assert queue.counts() == {"running": 2}
+
+
+def test_failed_job_is_retried_then_marked_failed(queue):
+    job_id = queue.enqueue(BRIEF)
+
+    queue.claim("w1")
+    assert queue.fail(job_id, "w1", "boom", max_attempts=2)
+    assert queue.counts() == {"pending": 1}
+
+    queue.claim("w1")
+    assert queue.fail(job_id, "w1", "boom again", max_attempts=2)
+    assert queue.counts() == {"failed": 1}
+    assert queue.claim("w1") is None
+    assert queue.results()[0]["error"] == "boom again"
+
+
+def test_only_the_current_holder_can_finish_a_job(queue, db_path):
+    job_id = queue.enqueue(BRIEF)
+    queue.claim("old")
+    set_updated_at(db_path, job_id, time.time() - 100)
+    queue.requeue_stale(max_attempts=3, lease_seconds=10)
+    queue.claim("new")
+
+    assert not queue.complete(job_id, "old", {"stale": True})
+    assert not queue.fail(job_id, "old", "late failure", max_attempts=3)
+    assert queue.complete(job_id, "new", {"fresh": True})
+    assert queue.results()[0]["result"] == {"fresh": True}
+
+
+def test_requeue_stale_only_touches_expired_leases(queue, db_path):
+    stale, live = queue.enqueue_many([BRIEF, BRIEF])
+    queue.claim("crashed")
+    queue.claim("alive")
+    set_updated_at(db_path, stale, time.time() - 100)
+
+    assert queue.requeue_stale(max_attempts=3, lease_seconds=10) == 1
+
+    statuses = {job["id"]: job["status"] for job in queue.results()}
+    assert statuses == {stale: "pending", live: "running"}
+
+
+def test_requeue_stale_fails_jobs_out_of_attempts(queue, db_path):
+    job_id = queue.enqueue(BRIEF)
+    queue.claim("crashed")
+    set_updated_at(db_path, job_id, time.time() - 100)
+
+    queue.requeue_stale(max_attempts=1, lease_seconds=10)
+
+    assert queue.counts() == {"failed": 1}
+
+
+def test_enqueue_many_rolls_back_on_invalid_brief(queue):
+    with pytest.raises(ValueError, match="Brief 1"):
+        queue.enqueue_many([BRIEF, {"goal": "Awareness"}, BRIEF])
+
+    assert queue.counts() == {}
+
+
+def test_rate_limiter_waits_once_bucket_is_empty(db_path):
+    limiter = RateLimiter(db_path, requests_per_minute=60, burst=2)
+
+    assert limiter._try_acquire() == 0
+    assert limiter._try_acquire() == 0
+    wait = limiter._try_acquire()
+    assert 0 < wait <= 1.0
+
+
+def respond(messages):
+    prompt = messages[0].content
+    if "Evaluate this copy" in prompt:
+        return json.dumps({
+            "criteria": {"clarity": 9, "storytelling": 9, "creativity": 9, "authenticity": 9, "impact": 9},
+            "average": 9,
+            "feedback": "Strong copy.",
+        })
+    if "Extract the formulas" in prompt:
+        return json.dumps({"selected_formulas": ["AIDA"], "reasoning": {"AIDA": "Drives action."}})
+    return "Stand-in copy."
+
+
+def stand_in_model_factory():
+    """Picklable factory: each worker builds its own local backend."""
+    return [LocalChatBackend("local", respond=respond)]
+
+
+def test_run_workers_drains_queue_with_stand_in_backend(db_path):
+    queue = JobQueue(db_path)
+    queue.enqueue_many([BRIEF, BRIEF, BRIEF])
+
+    counts = run_workers(db_path, workers=2, requests_per_minute=6000, model_factory=stand_in_model_factory)
+
+    assert counts == {"done": 3}
+    results = queue.results()
+    assert all(job["result"]["best_performing"] == "AIDA" for job in results)
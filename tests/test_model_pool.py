@@ -0,0 +1,182 @@
+import asyncio
+import time
+
+import pytest
+
+from model_pool import AllBackendsFailedError, LocalChatBackend, ModelPool
+
+
+class CountingBackend(LocalChatBackend):
+    """LocalChatBackend that records how many calls reached it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.call_count = 0
+
+    def invoke(self, messages, **kwargs):
+        self.call_count += 1
+        return super().invoke(messages, **kwargs)
+
+    async def ainvoke(self, messages, **kwargs):
+        self.call_count += 1
+        return await super().ainvoke(messages, **kwargs)
+
+
+def make_pool(backends, **kwargs):
+    kwargs.setdefault("explore", 0.0)
+    return ModelPool(backends, **kwargs)
+
+
+def stats_by_name(pool):
+    return {s["name"]: s for s in pool.stats()}
+
+
+def test_routes_to_faster_backend():
+    slow = CountingBackend("slow", latency=0.02)
+    fast = CountingBackend("fast", latency=0.001)
+    pool = make_pool([slow, fast])
+
+    async def run():
+        for _ in range(10):
+            await pool.ainvoke(["hi"])
+
+    asyncio.run(run())
+
+    # Each untried backend is explored once, then traffic settles on the faster one
+    assert slow.call_count == 1
+    assert fast.call_count == 9
+
+
+def test_fails_over_on_error():
+    broken = CountingBackend("broken", failure_rate=1.0)
+    healthy = CountingBackend("healthy")
+    pool = make_pool([broken, healthy])
+
+    response = pool.invoke(["hi"])
+
+    assert response.content == "Response from healthy"
+    assert broken.call_count == 1
+    assert stats_by_name(pool)["broken"]["error_ewma"] > 0
+
+
+def test_fails_over_on_timeout():
+    hung = CountingBackend("hung", latency=1.0)
+    healthy = CountingBackend("healthy")
+    pool = make_pool([hung, healthy], timeout=0.05)
+
+    started = time.monotonic()
+    response = asyncio.run(pool.ainvoke(["hi"]))
+
+    assert response.content == "Response from healthy"
+    assert time.monotonic() - started < 0.5
+
+
+def test_raises_when_every_backend_fails():
+    pool = make_pool([CountingBackend("a", failure_rate=1.0), CountingBackend("b", failure_rate=1.0)])
+
+    with pytest.raises(AllBackendsFailedError, match="a: a is unavailable; b: b is unavailable"):
+        pool.invoke(["hi"])
+
+
+def test_open_circuits_are_not_called():
+    a = CountingBackend("a", failure_rate=1.0)
+    b = CountingBackend("b", failure_rate=1.0)
+    pool = make_pool([a, b], failure_threshold=2, cooldown=60)
+
+    for _ in range(10):
+        with pytest.raises(AllBackendsFailedError):
+            pool.invoke(["hi"])
+
+    assert a.call_count == 2
+    assert b.call_count == 2
+    assert all(s["circuit_open"] for s in pool.stats())
+
+
+def test_circuit_closes_after_successful_probe():
+    backend = CountingBackend("flaky", failure_rate=1.0)
+    pool = make_pool([backend], failure_threshold=1, cooldown=0.05)
+
+    with pytest.raises(AllBackendsFailedError):
+        pool.invoke(["hi"])
+    assert stats_by_name(pool)["flaky"]["circuit_open"]
+
+    with pytest.raises(AllBackendsFailedError, match="every circuit is open"):
+        pool.invoke(["hi"])
+
+    time.sleep(0.06)
+    backend.failure_rate = 0.0
+    pool.invoke(["hi"])
+
+    assert not stats_by_name(pool)["flaky"]["circuit_open"]
+    assert backend.call_count == 2
+
+
+def test_half_open_allows_a_single_probe():
+    backend = CountingBackend("flaky", latency=0.05, failure_rate=1.0)
+    pool = make_pool([backend], failure_threshold=1, cooldown=0.05)
+
+    async def run():
+        with pytest.raises(AllBackendsFailedError):
+            await pool.ainvoke(["hi"])
+        await asyncio.sleep(0.06)
+        backend.failure_rate = 0.0
+        return await asyncio.gather(*(pool.ainvoke(["hi"]) for _ in range(5)), return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert backend.call_count == 2
+    assert sum(not isinstance(r, Exception) for r in results) == 1
+
+
+def test_bind_shares_stats_and_applies_arguments():
+    backend = LocalChatBackend("local", respond=lambda messages: "one two three four five")
+    pool = make_pool([backend])
+    bound = pool.bind(max_tokens=2)
+
+    assert bound.invoke(["hi"]).content == "one two"
+    assert pool.invoke(["hi"]).content == "one two three four five"
+    assert stats_by_name(pool)["local"]["calls"] == 2
+    assert bound.stats() == pool.stats()
+
+
+class RejectingBackend(CountingBackend):
+    """Backend that raises a fixed error, e.g. an HTTP error from a provider SDK."""
+
+    def __init__(self, name, error):
+        super().__init__(name)
+        self.error = error
+
+    def invoke(self, messages, **kwargs):
+        self.call_count += 1
+        raise self.error
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.mark.parametrize("error", [ValueError("prompt too long"), StatusError(400)])
+def test_request_errors_are_raised_without_failover(error):
+    rejecting = RejectingBackend("rejecting", error)
+    healthy = CountingBackend("healthy")
+    pool = make_pool([rejecting, healthy], failure_threshold=1)
+
+    for _ in range(3):
+        with pytest.raises(type(error)):
+            pool.invoke(["hi"])
+
+    assert healthy.call_count == 0
+    assert not stats_by_name(pool)["rejecting"]["circuit_open"]
+    assert stats_by_name(pool)["rejecting"]["error_ewma"] == 0
+
+
+@pytest.mark.parametrize("status_code", [429, 503])
+def test_overload_and_server_errors_fail_over(status_code):
+    rejecting = RejectingBackend("rejecting", StatusError(status_code))
+    healthy = CountingBackend("healthy")
+    pool = make_pool([rejecting, healthy])
+
+    assert pool.invoke(["hi"]).content == "Response from healthy"
+    assert stats_by_name(pool)["rejecting"]["error_ewma"] > 0
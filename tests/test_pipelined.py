@@ -0,0 +1,91 @@
+import asyncio
+import json
+import re
+import time
+
+from main import GenerateCopy, PipelinedGenerateAndScore, ScoringAgent, create_initial_state
+from model_pool import LocalChatBackend
+
+BRIEF = {
+    "content_idea": "No-code AI tools improve small business productivity",
+    "target_audience": "Small business owners",
+    "age": "35-44",
+    "format": "LinkedIn Post",
+    "goal": "Awareness",
+}
+
+FORMULAS = ["AIDA", "PAS", "BAB"]
+
+
+def respond(messages):
+    prompt = messages[0].content
+    if "Evaluate this copy" in prompt:
+        formula = re.search(r"Stand-in copy for (\w+)", prompt).group(1)
+        score = 9 if formula == "AIDA" else 6
+        return json.dumps({
+            "criteria": {"clarity": score, "storytelling": score, "creativity": score,
+                         "authenticity": score, "impact": score},
+            "average": score,
+            "feedback": f"Feedback for {formula}.",
+        })
+    formula = re.search(r"specializing in the (\w+) formula", prompt).group(1)
+    return f"Stand-in copy for {formula}."
+
+
+class SlowFormulaBackend(LocalChatBackend):
+    """Local backend that takes longer to write one formula's draft and logs when each call ends."""
+
+    def __init__(self, slow_formula, delay):
+        super().__init__("local", respond=respond)
+        self.slow_formula = slow_formula
+        self.delay = delay
+        self.events = []
+
+    def bind(self, **kwargs):
+        return self
+
+    async def ainvoke(self, messages, **kwargs):
+        prompt = messages[0].content
+        if f"specializing in the {self.slow_formula} formula" in prompt:
+            await asyncio.sleep(self.delay)
+        response = self._reply(messages)
+        kind = "scored" if "Evaluate this copy" in prompt else "drafted"
+        formula = re.search(r"(?:Stand-in copy for|specializing in the) (\w+)", prompt).group(1)
+        self.events.append((kind, formula, time.monotonic()))
+        return response
+
+
+def brief_state():
+    return dict(create_initial_state(BRIEF), selected_formulas=FORMULAS, revision_count=0)
+
+
+async def run_sequential(model, state):
+    generated = await GenerateCopy(model).generate_copy(state)
+    scored = await ScoringAgent(model).scoring_agent({**state, **generated})
+    return {**generated, **scored}
+
+
+def test_pipelined_node_matches_sequential_nodes():
+    state = brief_state()
+    model = LocalChatBackend("local", respond=respond)
+    pipeline = PipelinedGenerateAndScore(GenerateCopy(model), ScoringAgent(model))
+
+    sequential = asyncio.run(run_sequential(model, state))
+    pipelined = asyncio.run(pipeline.generate_and_score(state))
+
+    assert set(pipelined) == set(sequential)
+    for key in ["drafts", "scores", "feedback", "revision_count", "token_usage"]:
+        assert pipelined[key] == sequential[key], key
+    assert set(pipelined["drafts"]) == set(FORMULAS)
+
+
+def test_slow_draft_does_not_delay_scoring_of_fast_drafts():
+    model = SlowFormulaBackend("PAS", delay=0.3)
+    pipeline = PipelinedGenerateAndScore(GenerateCopy(model), ScoringAgent(model))
+
+    result = asyncio.run(pipeline.generate_and_score(brief_state()))
+
+    finished = {(kind, formula): at for kind, formula, at in model.events}
+    assert finished[("scored", "AIDA")] < finished[("drafted", "PAS")]
+    assert finished[("scored", "BAB")] < finished[("drafted", "PAS")]
+    assert result["feedback"]["PAS"] == "Feedback for PAS."
@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+import pytest
+
+from main import TaskAgent, create_copywriting_workflow, create_initial_state
+from model_pool import LocalChatBackend
+from tokens import (
+    DEFAULT_OUTPUT_BUDGET,
+    FORMAT_OUTPUT_BUDGETS,
+    MAX_CONTENT_IDEA_TOKENS,
+    count_tokens,
+    format_output_budget,
+    merge_usage,
+    record_usage,
+    truncate_to_tokens,
+)
+
+BRIEF = {
+    "content_idea": "No-code AI tools improve small business productivity",
+    "target_audience": "Small business owners",
+    "age": "35-44",
+    "format": "LinkedIn Post",
+    "goal": "Awareness",
+}
+
+
+def respond(messages):
+    prompt = messages[0].content
+    if "Evaluate this copy" in prompt:
+        return json.dumps({
+            "criteria": {"clarity": 9, "storytelling": 9, "creativity": 9, "authenticity": 9, "impact": 9},
+            "average": 9,
+            "feedback": "Strong copy.",
+        })
+    if "Extract the formulas" in prompt:
+        return json.dumps({"selected_formulas": ["AIDA"], "reasoning": {"AIDA": "Drives action."}})
+    return "Stand-in copy."
+
+
+def test_count_tokens_counts_words_and_punctuation():
+    assert count_tokens("") == 0
+    assert count_tokens(None) == 0
+    assert count_tokens("Hello, world!") == 4
+
+
+def test_count_tokens_splits_long_words():
+    assert count_tokens("internationalization") == 4
+
+
+def test_truncate_leaves_short_text_alone():
+    assert truncate_to_tokens("one two three", 3) == ("one two three", False)
+
+
+def test_truncate_cuts_at_token_boundary():
+    text, truncated = truncate_to_tokens("one two three, four five", 3)
+
+    assert truncated
+    assert text == "one two three"
+    assert count_tokens(text) <= 3
+
+
+def test_format_output_budget_falls_back_to_default():
+    assert format_output_budget("Case studies") == FORMAT_OUTPUT_BUDGETS["Case studies"]
+    assert format_output_budget("Billboard") == DEFAULT_OUTPUT_BUDGET
+
+
+def test_every_form_format_has_a_budget():
+    streamlit_app = pytest.importorskip("streamlit_app")
+
+    assert set(streamlit_app.FORMAT_OPTIONS) <= set(FORMAT_OUTPUT_BUDGETS)
+
+
+def test_record_and_merge_usage():
+    usage = record_usage({}, "one two", "three")
+    record_usage(usage, "four", "five six")
+
+    assert usage == {"calls": 2, "prompt_tokens": 3, "completion_tokens": 3}
+    assert merge_usage(dict(usage), {"calls": 1, "prompt_tokens": 10}) == {
+        "calls": 3, "prompt_tokens": 13, "completion_tokens": 3
+    }
+
+
+def test_task_agent_truncates_oversized_content_idea():
+    state = create_initial_state(dict(BRIEF, content_idea="word " * (MAX_CONTENT_IDEA_TOKENS + 50)))
+    agent = TaskAgent(LocalChatBackend("local", respond=respond))
+
+    result = asyncio.run(agent.task_agent(state))
+
+    assert count_tokens(result["content_idea"]) == MAX_CONTENT_IDEA_TOKENS
+    assert result["token_budget"]["content_idea_truncated"]
+    assert result["token_budget"]["content_idea_tokens"] == MAX_CONTENT_IDEA_TOKENS + 50
+    assert result["token_budget"]["max_output_tokens"] == FORMAT_OUTPUT_BUDGETS["LinkedIn Post"]
+    assert result["token_usage"]["calls"] == 2
+
+
+def test_token_budget_and_usage_reach_final_summary():
+    workflow = create_copywriting_workflow([LocalChatBackend("local", respond=respond)])
+
+    final_state = asyncio.run(workflow.ainvoke(create_initial_state(BRIEF)))
+
+    summary = final_state["final_summary"]
+    assert summary["token_usage"] == final_state["token_usage"]
+    assert summary["token_usage"]["calls"] == 4
+    assert summary["token_budget"]["format"] == "LinkedIn Post"
+    assert not summary["token_budget"]["content_idea_truncated"]
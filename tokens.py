@@ -0,0 +1,74 @@
+"""Local token accounting and output length budgets.
+
+Token counts are estimated locally so every prompt and response can be
+measured without a provider round-trip or a tokenizer download. The estimate
+follows how BPE tokenizers split English: one token per short word or
+punctuation mark, with long words split into several pieces.
+"""
+import re
+from typing import Dict, Tuple
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Upper bound on generated tokens per content format. The response includes
+# the copy plus a short explanation of how it follows the formula.
+FORMAT_OUTPUT_BUDGETS = {
+    "Short video script": 500,
+    "Social Media Post": 350,
+    "LinkedIn Post": 600,
+    "Case studies": 1200,
+    "Marketing Email": 800,
+}
+DEFAULT_OUTPUT_BUDGET = 800
+
+# Scores come back as a small JSON object; the prompt keeps feedback well inside this
+SCORING_OUTPUT_BUDGET = 400
+
+# Formula selection is a short analysis of 1-3 formulas
+FORMULA_SELECTION_BUDGET = 700
+
+# Re-parsing a free-form answer into JSON
+PARSE_OUTPUT_BUDGET = 500
+
+# Edit-based revisions return a compact patch, not the whole copy
+EDIT_OUTPUT_BUDGET = 300
+
+# Longer content ideas are cut before they reach any prompt
+MAX_CONTENT_IDEA_TOKENS = 300
+
+def _piece_tokens(piece: str) -> int:
+    return 1 + (len(piece) - 1) // 6
+
+def count_tokens(text: str) -> int:
+    """Estimate the number of tokens in `text`."""
+    return sum(_piece_tokens(piece) for piece in _TOKEN_PATTERN.findall(text or ""))
+
+def truncate_to_tokens(text: str, max_tokens: int) -> Tuple[str, bool]:
+    """Cut `text` to at most `max_tokens` tokens. Returns the text and whether it was cut."""
+    total = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        total += _piece_tokens(match.group())
+        if total > max_tokens:
+            return text[:match.start()].rstrip(), True
+    return text, False
+
+def format_output_budget(content_format: str) -> int:
+    """Maximum output tokens for a draft in the given content format."""
+    return FORMAT_OUTPUT_BUDGETS.get(content_format, DEFAULT_OUTPUT_BUDGET)
+
+def budget_to_words(max_tokens: int) -> int:
+    """Approximate word count that fits in a token budget, for use in prompts."""
+    return int(max_tokens * 0.7)
+
+def record_usage(usage: Dict[str, int], prompt: str, completion: str) -> Dict[str, int]:
+    """Add one model call's prompt and completion tokens to `usage` in place."""
+    usage["calls"] = usage.get("calls", 0) + 1
+    usage["prompt_tokens"] = usage.get("prompt_tokens", 0) + count_tokens(prompt)
+    usage["completion_tokens"] = usage.get("completion_tokens", 0) + count_tokens(completion)
+    return usage
+
+def merge_usage(usage: Dict[str, int], other: Dict[str, int]) -> Dict[str, int]:
+    """Add the counts in `other` to `usage` in place."""
+    for key, value in other.items():
+        usage[key] = usage.get(key, 0) + value
+    return usage